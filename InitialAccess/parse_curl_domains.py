@@ -4,10 +4,11 @@ parse_curl_domains_tlds.py
 
 Purpose:
   Parse a curl command (stdin or argument) and extract only domains whose
-  TLD (last label) appears in a provided/custom TLD list (to reduce false positives).
+  TLD (last label, or a compound suffix like co.uk) appears in a provided/custom
+  TLD list (to reduce false positives).
 
 Features:
-  - Accepts curl command via STDIN or as a CLI arg
+  - Accepts curl command via STDIN or as a CLI arg (stdin may hold many commands, read one at a time)
   - Loads TLD set from a local file (--tld-file) or optionally fetches latest IANA list (--fetch-tlds)
   - Normalizes hosts (removes ports/userinfo)
   - Handles --resolve / --connect-to / -H Host: headers / --url etc.
@@ -29,38 +30,56 @@ Usage examples:
 
 """
 from __future__ import annotations
-import sys, shlex, re, argparse, urllib.request, os
-from urllib.parse import urlparse
+import sys, shlex, re, os, functools, itertools, string
+from types import SimpleNamespace
+from collections.abc import Iterable, Iterator
 
 IANA_TLD_URL = "https://data.iana.org/TLD/tlds-alpha-by-domain.txt"
 
-DOMAIN_RE = re.compile(r'([A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)+)')
+# piped inputs with at least this many commands are parsed with a process pool;
+# opt-in (0 = off) since pool start-up outweighs the work on small inputs
+PARALLEL_THRESHOLD = 0
+
+# labels are bounded to the DNS limits (63 chars, 127 labels) so pathological
+# runs can't make the engine grow matches without bound; the lookbehinds stop
+# a chain that failed on an over-long label from matching a truncated tail of
+# that label or the labels after its dot (finditer never retries inside a
+# valid match, so this only affects chains that didn't match)
+DOMAIN_RE = re.compile(r'(?<![A-Za-z0-9-])(?<![A-Za-z0-9-]\.)([A-Za-z0-9-]{1,63}(?:\.[A-Za-z0-9-]{1,63}){1,126})')
+# scanned over the whole command, so only match where a header value starts
+# (start of string, whitespace or an opening quote), not inside URLs like
+# http://localhost:8080/
+HOST_HDR_RE = re.compile(r'(?:^|[\s\'"])Host\s*:\s*([^;,\s"\']+)', re.IGNORECASE)
+
+# characters that change shell quoting state, see _scan_quotes
+QUOTE_CHARS_RE = re.compile(r'\$\'|[\'"\\]')
+
+# characters that never need escaping in build_regex_for_label
+_LABEL_SAFE = frozenset(string.ascii_letters + string.digits + '-')
+
+def parse_tlds(txt: str) -> frozenset[str]:
+    """Parse newline-separated TLD text into a frozenset of interned lowercase
+       TLDs (no comments/blanks).
+    """
+    lines = (ln.strip() for ln in txt.lower().splitlines())
+    return frozenset(sys.intern(ln) for ln in lines if ln and not ln.startswith('#'))
 
-def load_tlds_from_file(path: str) -> set[str]:
-    tlds = set()
-    with open(path, 'r', encoding='utf-8') as fh:
-        for line in fh:
-            s = line.strip().lower()
-            if not s or s.startswith('#'):
-                continue
-            tlds.add(s)
-    return tlds
+def load_tlds_from_file(path: str) -> frozenset[str]:
+    with open(path, 'rb') as fh:
+        return parse_tlds(fh.read().decode('utf-8', errors='ignore'))
 
-def fetch_iana_tlds() -> set[str]:
-    """Fetch IANA TLD file and return lowercase set of TLDs (no comments)."""
+def fetch_iana_tlds() -> frozenset[str]:
+    """Fetch IANA TLD file and return lowercase frozenset of TLDs (no comments)."""
+    # imported here: urllib.request pulls in ssl/http.client, only needed for --fetch-tlds
+    import urllib.request
     try:
         with urllib.request.urlopen(IANA_TLD_URL, timeout=15) as resp:
             txt = resp.read().decode('utf-8', errors='ignore')
     except Exception as e:
         raise RuntimeError(f"Failed to fetch IANA TLDs: {e}")
-    tlds = set()
-    for line in txt.splitlines():
-        line = line.strip()
-        if not line or line.startswith('#'):
-            continue
-        tlds.add(line.lower())
-    return tlds
+    return parse_tlds(txt)
 
+@functools.lru_cache(maxsize=512)
 def normalize_host(netloc: str) -> str:
     # remove userinfo
     if '@' in netloc:
@@ -68,109 +87,235 @@ def normalize_host(netloc: str) -> str:
     # strip brackets for IPv6
     netloc = netloc.strip('[]')
     # remove port
-    netloc = netloc.split(':',1)[0]
+    netloc = netloc.partition(':')[0]
     return netloc.lower()
 
-def token_extract_domains(tokens: list[str]) -> set[str]:
-    domains = set()
+def _fast_netloc(url: str) -> str:
+    """Return the netloc of scheme://netloc/... without a full urlparse:
+       everything after '://' up to the first '/', '?' or '#'.
+       Callers only pass values already checked for an http(s):// prefix.
+    """
+    rest = url[url.find('://')+3:]
+    j = len(rest)
+    for c in '/?#':
+        k = rest.find(c, 0, j)
+        if k >= 0:
+            j = k
+    return rest[:j]
+
+def extract_domains(curl_cmd: str) -> set[str]:
+    """Extract candidate domains from a raw curl command.
+       Domain-like substrings and Host: headers are pulled from the whole
+       string in one regex pass each; the token walk only handles flags whose
+       values need curl-specific parsing (URLs, --resolve, --connect-to).
+    """
+    domains = {normalize_host(m.group(1)) for m in DOMAIN_RE.finditer(curl_cmd)}
+    domains.update(normalize_host(m.group(1)) for m in HOST_HDR_RE.finditer(curl_cmd))
+
+    try:
+        tokens = shlex.split(curl_cmd)
+    except Exception:
+        tokens = curl_cmd.split()
+
     i = 0
     while i < len(tokens):
         t = tokens[i]
 
-        # direct URLs
+        # direct URLs (catches dotless hosts the bulk pass can't see)
         if t.startswith(('http://','https://')):
-            try:
-                p = urlparse(t)
-                if p.netloc:
-                    domains.add(normalize_host(p.netloc))
-            except Exception:
-                pass
+            netloc = _fast_netloc(t)
+            if netloc:
+                domains.add(normalize_host(netloc))
 
         # --url / -I style next-token URLs
-        if t in ('--url','--url*','-I','--head') and i+1 < len(tokens):
+        elif t in ('--url','--url*','-I','--head') and i+1 < len(tokens):
             u = tokens[i+1]
             if u.startswith(('http://','https://')):
-                try:
-                    domains.add(normalize_host(urlparse(u).netloc))
-                except Exception:
-                    pass
-            i += 1
-
-        # Headers
-        if t in ('-H','--header') and i+1 < len(tokens):
-            hdr = tokens[i+1]
-            m = re.search(r'Host\s*:\s*([^;,\s"\']+)', hdr, re.IGNORECASE)
-            if m:
-                domains.add(normalize_host(m.group(1)))
-            else:
-                for d in DOMAIN_RE.findall(hdr):
-                    domains.add(normalize_host(d))
+                domains.add(normalize_host(_fast_netloc(u)))
             i += 1
 
         # --resolve: host:port:addr (can be comma separated)
-        if t == '--resolve' and i+1 < len(tokens):
-            val = tokens[i+1]
-            for part in re.split(r'\s*,\s*', val):
-                host = part.split(':',1)[0]
-                if host:
-                    domains.add(normalize_host(host))
-            i += 1
-
         # --connect-to: host:port:targethost:targetport OR similar
-        if t == '--connect-to' and i+1 < len(tokens):
+        elif t in ('--resolve','--connect-to') and i+1 < len(tokens):
             val = tokens[i+1]
-            for part in re.split(r'\s*,\s*', val):
-                host = part.split(':',1)[0]
+            for part in val.split(','):
+                host = part.strip().partition(':')[0]
                 if host:
                     domains.add(normalize_host(host))
             i += 1
 
-        # generic domain-like substrings in token
-        for d in DOMAIN_RE.findall(t):
-            domains.add(normalize_host(d))
-
         i += 1
 
     return domains
 
+def _scan_quotes(text: str, state: str | None) -> tuple[str | None, bool]:
+    """Return the shell quote state (None, "'", "$'" or '"') after reading
+       text, starting from state, and whether text ends in an unescaped
+       backslash (a line continuation). Follows bash rules: nothing is escaped
+       inside '...'; inside ANSI-C $'...' (used by Chrome's "Copy as cURL" for
+       bodies with ' or !) and elsewhere a backslash escapes the next char.
+    """
+    skip = -1
+    for m in QUOTE_CHARS_RE.finditer(text):
+        i = m.start()
+        c = m.group()
+        if i == skip:
+            if c != "$'":
+                continue
+            c = "'"  # escaped '$', the quote after it still counts
+        if state == "'":
+            if c != '\\' and c != '"':
+                state = None
+        elif c == '\\':
+            skip = i + 1
+        elif state is None:
+            state = c
+        elif c == state or (state == "$'" and c == "'"):
+            state = None
+    return state, skip == len(text)
+
+def iter_commands(stream) -> Iterator[str]:
+    """Yield curl commands from a line stream one at a time, joining
+       backslash-continued lines (as produced by "Copy as cURL"). A newline
+       inside a quoted value (e.g. a multi-line --data-raw body) does not
+       end the command.
+    """
+    buf = []
+    state = None
+    for line in stream:
+        line = line.rstrip('\r\n')
+        state, continued = _scan_quotes(line, state)
+        buf.append(line[:-1] if continued else line)
+        if continued or state is not None:
+            continue
+        cmd = '\n'.join(buf).strip()
+        buf = []
+        if cmd:
+            yield cmd
+    cmd = '\n'.join(buf).strip()
+    if cmd:
+        yield cmd
+
+def _merge_domain_sets(results: Iterable[set[str]]) -> tuple[set[str], int]:
+    found = set()
+    count = 0
+    for doms in results:
+        found |= doms
+        count += 1
+    return found, count
+
+def extract_all(commands: Iterable[str], threshold: int = PARALLEL_THRESHOLD) -> tuple[set[str], int]:
+    """Run extract_domains over every command and merge the results.
+       If threshold > 0 and at least threshold commands are available, they
+       are sharded across a multiprocessing pool; otherwise (or on a single
+       CPU, where a pool can't help) everything stays in-process.
+       Returns (domains, number of commands).
+    """
+    if (os.cpu_count() or 1) < 2:
+        threshold = 0
+    it = iter(commands)
+    head = list(itertools.islice(it, threshold)) if threshold > 0 else []
+    commands = itertools.chain(head, it)
+    if 0 < threshold <= len(head):
+        import multiprocessing
+        with multiprocessing.Pool(os.cpu_count()) as pool:
+            return _merge_domain_sets(pool.imap_unordered(extract_domains, commands, chunksize=64))
+    return _merge_domain_sets(map(extract_domains, commands))
+
+@functools.lru_cache(maxsize=512)
+def _idna_decode_label(label: str) -> str | None:
+    """Decode a single punycode label via the builtin 'idna' codec (lowercase),
+       or None if it doesn't decode. Cached since the same IDN TLDs repeat.
+    """
+    try:
+        return sys.intern(label.encode('ascii').decode('idna').lower())
+    except Exception:
+        return None
+
+def build_tld_trie(tlds: set[str]) -> dict:
+    """Build a reversed-label trie: 'co.uk' -> {'uk': {'co': {None: {}}}}.
+       A None key marks the end of a TLD/suffix.
+    """
+    trie: dict = {}
+    for t in tlds:
+        node = trie
+        for label in reversed(t.split('.')):
+            node = node.setdefault(sys.intern(label), {})
+        node[None] = {}
+    return trie
+
+def match_tld_suffix(domain: str, trie: dict) -> str | None:
+    """Walk domain labels right to left through trie and return the longest
+       matching suffix (e.g. 'co.uk' for 'a.example.co.uk'), or None.
+       domain is expected lowercase, as returned by normalize_host.
+    """
+    labels = domain.split('.')
+    node = trie
+    matched = 0
+    for depth, label in enumerate(reversed(labels), 1):
+        node = node.get(label)
+        if node is None:
+            break
+        if None in node:
+            matched = depth
+    return '.'.join(labels[-matched:]) if matched else None
+
+@functools.lru_cache(maxsize=8)
+def _compile_tld_trie(tlds: frozenset[str]) -> dict | None:
+    # only needed when the list has compound suffixes (co.uk); single-label
+    # lists keep using a plain set probe on the last label
+    if not any('.' in t for t in tlds):
+        return None
+    return build_tld_trie(tlds)
+
 def filter_by_tlds(domains: set[str], tlds: set[str]) -> set[str]:
-    """Keep only domains whose last label is in tlds set.
+    """Keep only domains whose TLD is in tlds set. Multi-label entries
+       (e.g. co.uk) are matched as full suffixes via a label trie.
        Also handle IDN punycode 'xn--' (match last label after punycode).
+       Domains are expected lowercase, as returned by normalize_host.
     """
+    frozen = frozenset(tlds)
+    trie = _compile_tld_trie(frozen)
     out = set()
     for d in domains:
         if not d:
             continue
-        parts = d.rsplit('.', maxsplit=2)  # keep up to 3 parts for safety
-        last = parts[-1].lower()
-        if last in tlds:
+        last = d.rpartition('.')[2]
+        if trie is not None:
+            matched = match_tld_suffix(d, trie) is not None
+        else:
+            matched = last in frozen
+        if matched:
             out.add(d)
         else:
             # sometimes domains are given as punycode IDN; try to decode last label
-            # but decoding requires 'idna' codec: builtin supports it via .encode/.decode
+            # (no 'xn--' anywhere means there is nothing for idna to decode)
+            if 'xn--' not in d:
+                continue
+            # only the last label matters, so decode just that instead of the whole domain
             if last.startswith('xn--'):
-                try:
-                    # decode the domain fully and re-evaluate
-                    decoded = d.encode('utf-8').decode('idna')
-                    last_decoded = decoded.rsplit('.', maxsplit=1)[-1].lower()
-                    if last_decoded in tlds:
-                        out.add(d)  # keep original (or could add decoded)
-                except Exception:
-                    pass
+                if _idna_decode_label(last) in frozen:
+                    out.add(d)  # keep original (or could add decoded)
     return out
 
-def suggest_wildcards(domains: set[str]) -> list[str]:
+def second_level_labels(domains: set[str]) -> set[str]:
+    """Second-level label (left of last dot) of each domain; dotless hosts
+       (e.g. localhost) contribute themselves.
+    """
+    labels = set()
+    for d in domains:
+        head, sep, last = d.rpartition('.')
+        labels.add(head.rpartition('.')[2] if sep else last)
+    return labels
+
+def suggest_wildcards(domains: set[str] | None = None, *, labels: set[str] | list[str] | None = None) -> list[str]:
     """Simple suggested wildcard patterns from domains:
        - uses second-level label (left of last dot) as label.*
        - example: login.example.com -> example.*
+       Pass precomputed labels (see second_level_labels) to skip re-deriving them.
     """
-    labels = set()
-    for d in domains:
-        parts = d.split('.')
-        if len(parts) >= 2:
-            labels.add(parts[-2])
-        else:
-            labels.add(parts[0])
+    if labels is None:
+        labels = second_level_labels(domains or ())
     return sorted(f"{lbl}.*" for lbl in labels)
 
 def build_regex_for_label(label: str) -> str:
@@ -178,10 +323,38 @@ def build_regex_for_label(label: str) -> str:
        e.g. for 'example' -> r'(^|\.)example\.[A-Za-z0-9.-]+$'
        (useful for IDS/wildcard-style matching)
     """
-    esc = re.escape(label)
+    # hostname labels are almost always plain LDH, which needs no escaping
+    esc = label if _LABEL_SAFE.issuperset(label) else re.escape(label)
     return rf'(^|\.){esc}\.[A-Za-z0-9.-]+$'
 
-def main():
+def _fast_parse_args(argv: list[str]) -> SimpleNamespace | None:
+    """Parse the common `--cmd CMD [--tld-file PATH]` invocation without
+       building an argparse parser. Returns None for anything else, so the
+       caller falls back to the full parser (which also handles --help/errors).
+    """
+    if len(argv) < 2 or argv[0] != '--cmd' or '--' in argv[1:]:
+        return None
+    # a flag in CMD's place (--cmd --help, --cmd -x) is argparse's to reject
+    if argv[1].startswith('-'):
+        return None
+    rest = argv[2:]
+    tld_file = None
+    if rest:
+        if len(rest) != 2 or rest[0] != '--tld-file':
+            return None
+        tld_file = rest[1]
+    return SimpleNamespace(cmd=argv[1], tld_file=tld_file, fetch_tlds=False, save_tlds=None,
+                           wildcards=False, regexes=False, show_all=False,
+                           parallel_threshold=PARALLEL_THRESHOLD)
+
+def parse_args(argv: list[str] | None = None):
+    if argv is None:
+        argv = sys.argv[1:]
+    args = _fast_parse_args(argv)
+    if args is not None:
+        return args
+
+    import argparse
     ap = argparse.ArgumentParser(description="Parse curl and extract domains filtered by TLD list")
     ap.add_argument('--cmd', help='curl command as single argument (if omitted, read stdin)')
     ap.add_argument('--tld-file', help='path to newline-separated tld list (lowercase preferred)')
@@ -190,20 +363,16 @@ def main():
     ap.add_argument('--wildcards', action='store_true', help='print suggested wildcard patterns (label.*)')
     ap.add_argument('--regexes', action='store_true', help='print per-label regex patterns')
     ap.add_argument('--show-all', action='store_true', help='show all matched domains (default)')
-    args = ap.parse_args()
-
-    # Read curl command
-    if args.cmd:
-        curl_cmd = args.cmd
-    else:
-        curl_cmd = sys.stdin.read().strip()
+    ap.add_argument('--parallel-threshold', type=int, default=PARALLEL_THRESHOLD, metavar='N',
+                    help='use a process pool when stdin has at least N commands (default 0: off; '
+                         'only worth it for large inputs on multi-core hosts)')
+    return ap.parse_args(argv)
 
-    if not curl_cmd:
-        print("Provide a curl command via --cmd or stdin. See --help.")
-        sys.exit(1)
+def main():
+    args = parse_args()
 
     # Load TLDs
-    tlds = set()
+    tlds = frozenset()
     if args.fetch_tlds:
         try:
             print("# fetching IANA TLD list...", file=sys.stderr)
@@ -224,19 +393,20 @@ def main():
             print(f"Error: tld file not found: {args.tld_file}", file=sys.stderr)
             sys.exit(1)
         tlds_from_file = load_tlds_from_file(args.tld_file)
-        tlds.update(tlds_from_file)
+        tlds = tlds | tlds_from_file if tlds else tlds_from_file
 
     if not tlds:
         print("No TLDs available. Provide --tld-file or --fetch-tlds.", file=sys.stderr)
         sys.exit(1)
 
-    # split tokens
-    try:
-        tokens = shlex.split(curl_cmd)
-    except Exception:
-        tokens = curl_cmd.split()
+    # Read curl command(s); stdin is consumed one command at a time
+    commands = [args.cmd] if args.cmd else iter_commands(sys.stdin)
+    found, seen_cmd = extract_all(commands, args.parallel_threshold)
+
+    if not seen_cmd:
+        print("Provide a curl command via --cmd or stdin. See --help.")
+        sys.exit(1)
 
-    found = token_extract_domains(tokens)
     filtered = filter_by_tlds(found, tlds)
 
     if args.show_all or not (args.wildcards or args.regexes):
@@ -247,14 +417,19 @@ def main():
         else:
             print("# (none)")
 
+    # second-level labels, shared by --wildcards and --regexes
+    labels = []
+    if args.wildcards or args.regexes:
+        labels = sorted(second_level_labels(filtered))
+
     if args.wildcards:
         print("\n# Suggested wildcard patterns (label.*):")
-        for w in suggest_wildcards(filtered):
+        for w in suggest_wildcards(labels=labels):
             print(w)
 
     if args.regexes:
         print("\n# Per-label regex patterns:")
-        for lbl in sorted({d.split('.')[-2] for d in filtered if '.' in d}):
+        for lbl in labels:
             print(build_regex_for_label(lbl))
 
 if __name__ == "__main__":